@@ -1,19 +1,39 @@
-from google import genai
 from google.genai import types
 import os
 import time
-from .config import GEMINI_MODEL_DEFAULT
+import random
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from .config import GEMINI_MODEL_DEFAULT, GEMINI_MODEL_FLASH
+from .audio_processor import merge_audio_files, get_audio_info, cleanup_files
+from .clients import get_client
+
+__all__ = ["analyze_discussion", "summarize_context"]
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on concurrent uploads per analysis to avoid Gemini rate spikes
+MAX_PARALLEL_UPLOADS = 8
+UPLOAD_MAX_RETRIES = 4
+# Total bytes of audio sent inline per request (base64 inflates this by ~4/3,
+# and the whole request must stay under Gemini's 20MB inline limit)
+INLINE_AUDIO_MAX_BYTES = 14 * 1024 * 1024
+# Clips this short are merged into one audio (with gaps) so the batch needs a single Part
+MERGE_CLIP_MAX_SECONDS = 30
+MERGE_MAX_BYTES = 20 * 1024 * 1024
+MERGE_GAP_SECONDS = 0.5
 
 PROMPTS = {
     "debate": """
-あなたはプロの議論アナリスト兼ファクトチェッカーです。提供された複数の音声ファイル（各ファイル名にユーザーIDまたは名前が含まれる）を分析し、以下の形式でレポートを作成してください。
+あなたはプロの議論アナリスト兼ファクトチェッカーです。提供された複数の音声ファイル（何番目の音声が誰の発言かは「発言者一覧」に記載）を分析し、以下の形式でレポートを作成してください。
 
 分析ルール:
-1. 各ファイルの声とユーザー名を正確に紐付けてください。
+1. 「発言者一覧」の順番に従って、各音声の声とユーザー名を正確に紐付けてください。
 2. **Grounding (Google検索) は必須です**。議論の中で出た事実（例：「現在の失業率は〜」「〇〇というニュースがあった」）について、必ず検索機能を使用して最新情報を確認してください。
 3. 以前の発言と矛盾している点があれば指摘してください。
 4. **【重要】音声が無音、ノイズのみ、または意味のある会話が含まれていない場合は、無理に分析せず、「特に新しい議論はありませんでした。」とだけ出力してください。幻覚（ハルシネーション）を起こさないでください。**
 5. 「前回の文脈」はあくまで参考情報です。**今回提供された音声ファイルに含まれていない発言を、前回の文脈から捏造してレポートに含めないでください。**
+6. 音声が1つに連結されている場合は、「発言タイムライン」の時間帯（[開始-終了] 発言者名）で発言者を判別してください。
 
 出力項目:
 【議論の要約】: (300字以内)
@@ -25,13 +45,14 @@ PROMPTS = {
 **前置き・挨拶・自己紹介は一切不要です。上記の出力項目のみをそのまま出力してください。**
 """,
     "summary": """
-あなたは会議の書記です。提供された音声ファイルを分析し、途中から参加した人でも状況がわかるような親切な要約を作成してください。
+あなたは会議の書記です。提供された音声ファイル（何番目の音声が誰の発言かは「発言者一覧」に記載）を分析し、途中から参加した人でも状況がわかるような親切な要約を作成してください。
 
 分析ルール:
 1. 誰が何について話しているかを明確にしてください。
 2. 専門用語や文脈依存の単語には簡単な補足を加えてください。
 3. **【重要】音声が無音、ノイズのみ、または意味のある会話が含まれていない場合は、無理に分析せず、「特に新しい議論はありませんでした。」とだけ出力してください。**
 4. 「前回の文脈」はあくまで参考情報です。**今回提供された音声ファイルに含まれていない発言を、前回の文脈から捏造してレポートに含めないでください。**
+5. 音声が1つに連結されている場合は、「発言タイムライン」の時間帯（[開始-終了] 発言者名）で発言者を判別してください。
 
 出力項目:
 【現在のトピック】: (今何を話しているか、数行でシンプルに)
@@ -43,6 +64,13 @@ PROMPTS = {
 """
 }
 
+# Background workers for best-effort deletes of uploaded files (they expire anyway)
+_DELETE_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="gemini-delete")
+
+def _get_client(api_key):
+    # Shared per-key client (see clients.py), reused so HTTP connections stay warm
+    return get_client(api_key)
+
 def upload_to_gemini(client, file_path, mime_type="audio/mp3"):
     """
     Uploads a file to Gemini File API using google-genai SDK.
@@ -56,31 +84,96 @@ def upload_to_gemini(client, file_path, mime_type="audio/mp3"):
         print(f"Upload failed: {e}")
         raise e
 
-def wait_for_files_active(client, files):
+def _is_rate_limited(e):
+    return "429" in str(e) or "RESOURCE_EXHAUSTED" in str(e) or "Quota exceeded" in str(e)
+
+def upload_with_retry(client, file_path, mime_type="audio/mp3"):
     """
-    Waits for files to proceed to ACTIVE state.
+    Uploads a file, retrying with exponential backoff + jitter on 429.
     """
-    print("Waiting for file processing...")
-    for file_ref in files:
-        # file_ref might be just the object returned by upload.
-        # We need to poll its execution state.
-        
-        while True:
-            # Refresh file info
-            try:
-                current_file = client.files.get(name=file_ref.name)
-                if current_file.state == "ACTIVE":
-                    break
-                if current_file.state == "FAILED":
-                    raise Exception(f"File {current_file.name} failed to process")
-                
-                print(".", end="", flush=True)
-                time.sleep(2)
-            except Exception as e:
-                print(f"Error checking file state: {e}")
-                break
-                
-    print("...all files ready")
+    for attempt in range(UPLOAD_MAX_RETRIES + 1):
+        try:
+            return upload_to_gemini(client, file_path, mime_type)
+        except Exception as e:
+            if attempt == UPLOAD_MAX_RETRIES or not _is_rate_limited(e):
+                raise
+            delay = min(16.0, 2 ** attempt) + random.uniform(0, 1)
+            print(f"Rate limited on upload, retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+def _wait_for_file_active(client, file_ref):
+    """
+    Polls a single file until it is ACTIVE, backing off from 0.25s up to 2s.
+    """
+    attempt = 0
+    while True:
+        # Refresh file info
+        try:
+            current_file = client.files.get(name=file_ref.name)
+        except Exception as e:
+            print(f"Error checking file state: {e}")
+            return
+
+        if current_file.state == "ACTIVE":
+            return
+        if current_file.state == "FAILED":
+            raise Exception(f"File {current_file.name} failed to process")
+
+        logger.debug("polling %s (state=%s)", file_ref.name, current_file.state)
+        time.sleep(min(2.0, 0.25 * 2 ** attempt + random.uniform(0, 0.1)))
+        attempt += 1
+
+def _upload_and_wait(client, file_path):
+    """
+    Uploads a file and polls it to ACTIVE on the same worker, so processing of
+    earlier files overlaps with uploads of later ones.
+    """
+    file_ref = upload_with_retry(client, file_path)
+    try:
+        _wait_for_file_active(client, file_ref)
+    except Exception:
+        try:
+            client.files.delete(name=file_ref.name)
+        except Exception:
+            pass
+        raise
+    return file_ref
+
+def _delete_quietly(client, file_name):
+    try:
+        client.files.delete(name=file_name)
+    except Exception:
+        pass
+
+def _format_timestamp(seconds):
+    return f"{int(seconds // 60)}:{seconds % 60:04.1f}"
+
+def _merge_short_clips(targets):
+    """
+    Merges a batch of short clips into one MP3 separated by short silences.
+    Returns (merged_path, timeline_text), or None when merging doesn't apply.
+    """
+    paths = [file_path for _, file_path in targets]
+    try:
+        if sum(os.path.getsize(p) for p in paths) >= MERGE_MAX_BYTES:
+            return None
+    except OSError:
+        return None
+
+    durations = [get_audio_info(p) for p in paths]
+    if not all(0 < d < MERGE_CLIP_MAX_SECONDS for d in durations):
+        return None
+
+    merged_path = merge_audio_files(paths, paths[0].rsplit('.', 1)[0] + "_merged.mp3", MERGE_GAP_SECONDS)
+    if not merged_path:
+        return None
+
+    lines = []
+    start = 0.0
+    for (user_name, _), duration in zip(targets, durations):
+        lines.append(f"- [{_format_timestamp(start)}-{_format_timestamp(start + duration)}] {user_name}")
+        start += duration + MERGE_GAP_SECONDS
+    return merged_path, "発言タイムライン（全員の音声を1つに連結済み）:\n" + "\n".join(lines)
 
 def analyze_discussion(audio_files_map, context_history="", user_map=None, api_key=None, mode="debate"):
     """
@@ -96,10 +189,14 @@ def analyze_discussion(audio_files_map, context_history="", user_map=None, api_k
     if not use_key:
         return "❌ APIキーが設定されていません。`/settings set_apikey` で設定してください。"
 
-    # Initialize Client with specific key
+    targets = []
+    for user_id, file_path in audio_files_map.items():
+        user_name = user_map.get(user_id, f"User_{user_id}") if user_map else f"User_{user_id}"
+        targets.append((user_name, file_path))
+
+    # Get (or create) the Client for this specific key
     try:
-        # Pass the key directly to Client
-        client = genai.Client(api_key=use_key)
+        client = _get_client(use_key)
     except Exception as e:
         return f"❌ APIクライアントの初期化に失敗しました: {e}"
 
@@ -124,23 +221,83 @@ def analyze_discussion(audio_files_map, context_history="", user_map=None, api_k
         ))
 
     current_turn_parts = []
-    
-    for user_id, file_path in audio_files_map.items():
-        if os.path.exists(file_path):
-            user_name = user_map.get(user_id, f"User_{user_id}") if user_map else f"User_{user_id}"
-            
-            try:
-                uploaded_file = upload_to_gemini(client, file_path)
+
+    # Many short clips: send one merged audio with a timeline instead of N audios
+    merged_path = None
+    timeline_header = None
+    if len(targets) >= 2:
+        merged = _merge_short_clips(targets)
+        if merged:
+            merged_path, timeline_header = merged
+            targets = [("", merged_path)]
+
+    # Small files are sent inline with the request: no upload, polling or delete.
+    # The inline budget is shared by all files so the request stays under the API limit.
+    inline_data = {}
+    inline_total = 0
+    missing = set()
+    for i, (_, file_path) in enumerate(targets):
+        try:
+            size = os.path.getsize(file_path)
+            if inline_total + size <= INLINE_AUDIO_MAX_BYTES:
+                with open(file_path, 'rb') as f:
+                    inline_data[i] = f.read()
+                inline_total += size
+        except FileNotFoundError:
+            missing.add(i)
+        except OSError as e:
+            print(f"Could not read {file_path} for inline upload: {e}")
+
+    upload_indices = [i for i in range(len(targets)) if i not in inline_data and i not in missing]
+
+    # Upload the remaining files concurrently; each worker chains upload -> ACTIVE wait
+    futures = {}
+    executor = None
+    if upload_indices:
+        logger.info("Uploading and waiting for file processing...")
+        executor = ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_UPLOADS, len(upload_indices)))
+        for i in upload_indices:
+            _, file_path = targets[i]
+            futures[i] = executor.submit(_upload_and_wait, client, file_path)
+
+    # One text Part lists the speakers by position instead of a label Part per audio
+    speaker_names = []
+    try:
+        # Collect in speaker order so it stays stable
+        for i, (user_name, file_path) in enumerate(targets):
+            if i in missing:
+                continue
+            if i in inline_data:
+                audio_part = types.Part.from_bytes(data=inline_data[i], mime_type="audio/mp3")
+            else:
+                try:
+                    uploaded_file = futures[i].result()
+                except FileNotFoundError:
+                    continue
+                except Exception as e:
+                    print(f"Skipping file {file_path} due to upload error: {e}")
+                    continue
+
                 uploaded_files.append(uploaded_file)
-                
-                current_turn_parts.append(types.Part.from_text(text=f"発言者: {user_name}"))
                 # Pass file URI for processing
-                current_turn_parts.append(types.Part.from_uri(
+                audio_part = types.Part.from_uri(
                     file_uri=uploaded_file.uri,
                     mime_type=uploaded_file.mime_type
-                ))
-            except Exception as e:
-                print(f"Skipping file {file_path} due to upload error: {e}")
+                )
+
+            speaker_names.append(user_name)
+            current_turn_parts.append(audio_part)
+    finally:
+        if executor:
+            executor.shutdown(wait=True)
+        if merged_path:
+            cleanup_files([merged_path])
+
+    if current_turn_parts:
+        speaker_header = timeline_header or "発言者一覧:\n" + "\n".join(
+            f"- {n}番目の音声: {name}" for n, name in enumerate(speaker_names, start=1)
+        )
+        current_turn_parts.insert(0, types.Part.from_text(text=speaker_header))
 
     if not current_turn_parts:
         return "音声データがありませんでした（アップロード失敗またはファイルなし）。"
@@ -152,8 +309,6 @@ def analyze_discussion(audio_files_map, context_history="", user_map=None, api_k
     ))
 
     try:
-        wait_for_files_active(client, uploaded_files)
-        
         # Configure tools
         # Enable Google Search
         tool_config = types.Tool(
@@ -171,13 +326,6 @@ def analyze_discussion(audio_files_map, context_history="", user_map=None, api_k
             config=generate_config
         )
         
-        # Clean up files
-        for f in uploaded_files:
-            try:
-                client.files.delete(name=f.name)
-            except:
-                pass
-            
         return response.text + f"\n\n(Model: {GEMINI_MODEL_DEFAULT})"
 
     except Exception as e:
@@ -185,3 +333,27 @@ def analyze_discussion(audio_files_map, context_history="", user_map=None, api_k
         if "429" in str(e) or "Quota exceeded" in str(e):
              return "⚠️ 分析のリクエスト制限（Quota Limit）に達しました。"
         return f"分析中にエラーが発生しました: {e}"
+
+    finally:
+        # Uploaded files are never reused; delete them in the background (even
+        # after a failed generation) so the response doesn't wait on it
+        for f in uploaded_files:
+            _DELETE_POOL.submit(_delete_quietly, client, f.name)
+
+def summarize_context(context, api_key, max_chars=500):
+    """
+    Compresses older discussion context into a short gist so the prompt stays
+    bounded over long sessions. Returns None on failure.
+    """
+    if not context or not api_key:
+        return None
+    try:
+        client = _get_client(api_key)
+        response = client.models.generate_content(
+            model=GEMINI_MODEL_FLASH,
+            contents=f"次の議論の文脈を、発言者ごとの立場と決定事項が分かるように{max_chars}字以内で要約してください。前置きは不要です。\n\n{context}"
+        )
+        return response.text
+    except Exception as e:
+        print(f"Context summarization failed: {e}")
+        return None
@@ -1,36 +1,101 @@
-from pydub import AudioSegment
 import os
 import glob
-from .config import TEMP_AUDIO_DIR
+import wave
+import asyncio
+import subprocess
+from .config import TEMP_AUDIO_DIR, SAMPLE_RATE, CHANNELS
 
-def convert_to_mp3(file_path):
+# One encoder thread per ffmpeg, and at most one ffmpeg per core at a time,
+# so parallel encodes use separate cores instead of contending for them
+_FFMPEG_BASE = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-threads", "1"]
+_ENCODE_SLOTS = asyncio.Semaphore(os.cpu_count() or 1)
+
+def _pcm_encode_cmd(mp3_path):
+    # Discord PCM is s16le, 48k, 2ch, read from stdin
+    return _FFMPEG_BASE + ["-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", str(CHANNELS),
+            "-i", "pipe:0", "-codec:a", "libmp3lame", "-q:a", "4", mp3_path]
+
+def encode_pcm_to_mp3(pcm, mp3_path):
     """
-    Converts a file (WAV or PCM) to MP3 using pydub.
-    Returns the path to the new MP3 file.
+    Encodes in-memory PCM (any bytes-like object) to an MP3 file by piping it
+    to ffmpeg's stdin, so the raw audio never touches the disk.
+    Returns mp3_path, or None on failure.
     """
-    if not os.path.exists(file_path):
+    try:
+        subprocess.run(_pcm_encode_cmd(mp3_path), input=pcm, check=True, capture_output=True)
+        return mp3_path
+    except subprocess.CalledProcessError as e:
+        print(f"Error encoding {mp3_path}: {e.stderr.decode(errors='replace').strip()}")
         return None
-    
+    except Exception as e:
+        print(f"Error encoding {mp3_path}: {e}")
+        return None
+
+async def aencode_pcm_to_mp3(pcm, mp3_path, executor=None):
+    """
+    Async variant of encode_pcm_to_mp3.
+    executor is only used when the event loop can't spawn subprocesses
+    (the bot passes SessionManager.ffmpeg_executor; None means the loop's default).
+    """
+    async with _ENCODE_SLOTS:
+        return await _aencode_pcm_to_mp3(pcm, mp3_path, executor)
+
+async def _aencode_pcm_to_mp3(pcm, mp3_path, executor):
     try:
-        if file_path.endswith(".pcm"):
-            # Import AudioSegment inside function if strictly needed, but it's at top level
-            # Discord PCM is s16le, 48k, 2ch
-            with open(file_path, 'rb') as f:
-                pcm_data = f.read()
-            sound = AudioSegment(
-                data=pcm_data,
-                sample_width=2, # 16 bit
-                frame_rate=48000,
-                channels=2
-            )
-        else:
-            sound = AudioSegment.from_wav(file_path)
-            
-        mp3_path = file_path.rsplit('.', 1)[0] + ".mp3"
-        sound.export(mp3_path, format="mp3")
+        proc = await asyncio.create_subprocess_exec(
+            *_pcm_encode_cmd(mp3_path),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+    except NotImplementedError:
+        # Event loops without subprocess support (e.g. SelectorEventLoop on Windows)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, encode_pcm_to_mp3, pcm, mp3_path)
+    except Exception as e:
+        print(f"Error encoding {mp3_path}: {e}")
+        return None
+
+    try:
+        _, stderr = await proc.communicate(input=pcm)
+        if proc.returncode != 0:
+            print(f"Error encoding {mp3_path}: {stderr.decode(errors='replace').strip()}")
+            return None
         return mp3_path
     except Exception as e:
-        print(f"Error converting {file_path}: {e}")
+        print(f"Error encoding {mp3_path}: {e}")
+        return None
+
+async def aencode_all_pcm_to_mp3(jobs, executor=None):
+    """
+    Encodes several (pcm, mp3_path) pairs concurrently.
+    Returns a list of MP3 paths (None for failures) in the same order.
+    One failing encode never cancels the others.
+    """
+    results = await asyncio.gather(*(aencode_pcm_to_mp3(pcm, path, executor) for pcm, path in jobs), return_exceptions=True)
+    return [None if isinstance(r, BaseException) else r for r in results]
+
+def merge_audio_files(file_paths, out_path, gap_seconds=0.5):
+    """
+    Concatenates audio files into a single MP3, following each one with
+    gap_seconds of silence. Returns out_path, or None on failure.
+    """
+    n = len(file_paths)
+    cmd = _FFMPEG_BASE + ["-nostdin"]
+    for path in file_paths:
+        cmd += ["-i", path]
+    filters = "".join(f"[{i}:a]apad=pad_dur={gap_seconds}[a{i}];" for i in range(n))
+    filters += "".join(f"[a{i}]" for i in range(n)) + f"concat=n={n}:v=0:a=1[out]"
+    cmd += ["-filter_complex", filters, "-map", "[out]", "-codec:a", "libmp3lame", "-q:a", "4", out_path]
+
+    try:
+        subprocess.run(cmd, check=True, capture_output=True)
+        return out_path
+    except subprocess.CalledProcessError as e:
+        print(f"Error merging audio: {e.stderr.decode(errors='replace').strip()}")
+        return None
+    except Exception as e:
+        print(f"Error merging audio: {e}")
         return None
 
 def cleanup_files(file_paths):
@@ -38,20 +103,61 @@ def cleanup_files(file_paths):
     Removes the specified files.
     """
     for path in file_paths:
-        if path and os.path.exists(path):
-            try:
-                os.remove(path)
-            except Exception as e:
-                print(f"Error removing {path}: {e}")
+        if not path:
+            continue
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error removing {path}: {e}")
+
+async def acleanup_files(file_paths):
+    """
+    Removes the specified files without blocking the event loop.
+    """
+    await asyncio.to_thread(cleanup_files, file_paths)
+
+def cleanup_temp_dir(prefix=""):
+    """
+    Removes every file in TEMP_AUDIO_DIR whose name starts with prefix.
+    """
+    try:
+        with os.scandir(TEMP_AUDIO_DIR) as it:
+            paths = [entry.path for entry in it if entry.is_file() and entry.name.startswith(prefix)]
+    except FileNotFoundError:
+        return
+    cleanup_files(paths)
+
+async def acleanup_temp_dir(prefix=""):
+    """
+    Async variant of cleanup_temp_dir.
+    """
+    await asyncio.to_thread(cleanup_temp_dir, prefix)
 
 def get_audio_info(file_path):
     """
     Returns duration in seconds.
+    Reads only headers/metadata where possible instead of decoding the audio.
     """
     if not os.path.exists(file_path):
         return 0
     try:
+        if file_path.endswith(".pcm"):
+            # Raw s16le: 2 bytes per sample per channel
+            return os.path.getsize(file_path) / (SAMPLE_RATE * CHANNELS * 2)
+        if file_path.endswith(".wav"):
+            with wave.open(file_path, 'rb') as w:
+                return w.getnframes() / w.getframerate()
+        if file_path.endswith(".mp3"):
+            result = subprocess.run(
+                ["ffprobe", "-v", "quiet", "-show_entries", "format=duration", "-of", "csv=p=0", file_path],
+                check=True, capture_output=True, text=True
+            )
+            return float(result.stdout.strip())
+
+        from pydub import AudioSegment
         audio = AudioSegment.from_file(file_path)
         return len(audio) / 1000.0
-    except:
+    except Exception:
         return 0
@@ -2,18 +2,19 @@ import discord
 from discord.ext import commands
 import os
 import sys
-import webbrowser
-import requests
-import google.genai as genai_sdk # Rename to avoid conflict if any, though actually it's a module
-from google import genai
-
-from .config import DISCORD_TOKEN, GUILD_ID
+import json
+import asyncio
+import time
+import hashlib
+import queue
+import atexit
+import logging
+import logging.handlers
+import aiohttp
+
+from .config import DISCORD_TOKEN, GUILD_ID, CACHE_DIR, VALIDATION_CACHE_TTL, GEMINI_MODEL_DEFAULT
 from .database import init_db, update_guild_setting, get_guild_settings, init_user_db, set_user_key, get_user_key
-from .session_manager import SessionManager
-
-# Initialize Database
-init_db()
-init_user_db()
+from .session_manager import SessionManager, COUNTDOWN_TEXT
 
 intents = discord.Intents.default()
 intents.voice_states = True
@@ -28,32 +29,108 @@ def resource_path(relative_path):
             return os.path.join(os.path.dirname(sys.executable), relative_path)
     return os.path.join(os.path.abspath("."), relative_path)
 
-def validate_discord_token(token):
+# Validated-credential cache: {blake2b(credential): expiry_ts}. Only successes
+# are stored, so a revoked credential is re-checked once its entry expires.
+VALIDATION_CACHE_PATH = os.path.join(CACHE_DIR, "validated.json")
+# In-process memo of the same, so repeated checks don't even read the file
+_VALIDATED_HASHES = set()
+
+DISCORD_ME_URL = "https://discord.com/api/v10/users/@me"
+
+def _credential_hash(value):
+    return hashlib.blake2b(value.encode(), digest_size=16).hexdigest()
+
+def _load_validation_cache():
+    try:
+        with open(VALIDATION_CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_validation_cache(cache):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(VALIDATION_CACHE_PATH, "w") as f:
+            json.dump(cache, f)
+    except OSError as e:
+        print(f"Could not write validation cache: {e}")
+
+def is_validation_cached(value):
+    h = _credential_hash(value)
+    if h in _VALIDATED_HASHES:
+        return True
+    expiry = _load_validation_cache().get(h)
+    if expiry is not None and expiry > time.time():
+        _VALIDATED_HASHES.add(h)
+        return True
+    return False
+
+def remember_validation(value):
+    _VALIDATED_HASHES.add(_credential_hash(value))
+    now = time.time()
+    cache = {h: exp for h, exp in _load_validation_cache().items() if exp > now}
+    cache[_credential_hash(value)] = now + VALIDATION_CACHE_TTL
+    _save_validation_cache(cache)
+
+def forget_validation(value):
+    _VALIDATED_HASHES.discard(_credential_hash(value))
+    cache = _load_validation_cache()
+    if cache.pop(_credential_hash(value), None) is not None:
+        _save_validation_cache(cache)
+
+async def validate_discord_token_async(token):
+    """Checks a bot token against /users/@me without blocking the event loop."""
+    if is_validation_cached(token):
+        return True
     headers = {"Authorization": f"Bot {token}"}
     try:
-        response = requests.get("https://discord.com/api/v10/users/@me", headers=headers)
-        return response.status_code == 200
-    except:
+        async with aiohttp.ClientSession(headers=headers, timeout=aiohttp.ClientTimeout(total=5)) as http:
+            async with http.get(DISCORD_ME_URL) as response:
+                status = response.status
+    except (aiohttp.ClientError, asyncio.TimeoutError):
         return False
 
+    if status == 200:
+        remember_validation(token)
+        return True
+    if status == 401:
+        forget_validation(token)
+    return False
+
+def validate_discord_token(token):
+    # Only used before bot.run(), when no event loop is running yet
+    return asyncio.run(validate_discord_token_async(token))
+
+# Status codes the API answers a bad key with (an unknown key comes back as 400 API_KEY_INVALID)
+_INVALID_KEY_CODES = (400, 401, 403)
+
 def validate_gemini_key(key):
-    try:
-        client = genai.Client(api_key=key)
-        # Try listing models to verify key (fetching first page is enough)
-        # The new SDK returns an iterator/generator
-        next(client.models.list(), None) 
+    """
+    True if the key is accepted, False if the API rejects it.
+    Any other failure (network, 5xx, quota) is raised: it says nothing about the key.
+    """
+    if is_validation_cached(key):
         return True
-    except:
-        # In case next() fails because list is empty (unlikely) or auth fails
-        return False
+    from google.genai import errors
+    from .clients import get_client
+
+    try:
+        # A single-model GET is the cheapest authenticated call (vs. paging the model list)
+        get_client(key).models.get(model=GEMINI_MODEL_DEFAULT)
+    except errors.ClientError as e:
+        if e.code in _INVALID_KEY_CODES:
+            return False
+        raise
+    remember_validation(key)
+    return True
 
 def setup_credentials():
     # 1. Try Environment Variables (from .env or system)
     token = os.getenv("DISCORD_TOKEN") or DISCORD_TOKEN
-    api_key = os.getenv("GEMINI_API_KEY")
 
-    # If both exist and appear valid-ish (basic check), skip setup
-    if token and api_key:
+    # Gemini keys are per-user (stored via /settings set_apikey) and validated
+    # when registered, so only the Discord token is needed to start.
+    if token:
         return token
 
     # 2. CLI Setup (Unified for App/Docker)
@@ -70,59 +147,87 @@ def setup_credentials():
         if not validate_discord_token(i_token):
             print("❌ Invalid Discord Token. Please try again.")
             continue
-            
-        i_key = input("Gemini API Key: ").strip()
-        if not i_key: continue
-        
-        if not validate_gemini_key(i_key):
-            print("❌ Invalid Gemini API Key. Please try again.")
-            continue
         
         # Save
         with open(".env", "w") as f:
             f.write(f"DISCORD_TOKEN={i_token}\n")
-            f.write(f"GEMINI_API_KEY={i_key}\n")
         
         os.environ["DISCORD_TOKEN"] = i_token
-        os.environ["GEMINI_API_KEY"] = i_key
         print("✅ Credentials saved to .env. Starting bot...")
         return i_token
 
 # Load Opus
-if not discord.opus.is_loaded():
-    opus_filename = ""
-    match sys.platform:
-        case "win32":
-            opus_filename = "libopus.dll"
-        case "darwin":
-            opus_filename = "libopus.dylib"
-        case "linux":
-            opus_filename = "libopus.so"
-
-    bundled_opus = resource_path(opus_filename)
-    if os.path.exists(bundled_opus):
-        try:
-            discord.opus.load_opus(bundled_opus)
-            print(f"Loaded bundled opus from {bundled_opus}")
-        except Exception as e:
-            print(f"Failed to load bundled opus: {e}")
-    else:
+# sys.platform -> (bundled file name, system library path; None = ask ctypes.util.find_library)
+_OPUS_NAMES = {
+    "win32": ("libopus.dll", "libopus-0.dll"),
+    "darwin": ("libopus.dylib", "/opt/homebrew/lib/libopus.dylib"),
+    "linux": ("libopus.so", None),
+}
+OPUS_PATH_CACHE = os.path.join(CACHE_DIR, "opus_path")
+
+def _read_cached_opus_path():
+    try:
+        with open(OPUS_PATH_CACHE) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def _write_cached_opus_path(path):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(OPUS_PATH_CACHE, "w") as f:
+            f.write(path)
+    except OSError as e:
+        print(f"Could not cache opus path: {e}")
+
+def load_opus_library():
+    """
+    Loads libopus: bundled copy first, then the path found on a previous run,
+    then platform discovery (whose result is cached for next time, since
+    find_library shells out on Linux).
+    """
+    if discord.opus.is_loaded():
+        return
+
+    bundled_name, system_path = _OPUS_NAMES.get(sys.platform, (None, None))
+
+    if bundled_name:
+        bundled_opus = resource_path(bundled_name)
+        if os.path.exists(bundled_opus):
+            try:
+                discord.opus.load_opus(bundled_opus)
+                print(f"Loaded bundled opus from {bundled_opus}")
+            except Exception as e:
+                print(f"Failed to load bundled opus: {e}")
+            return
+
+    # Loaded as-is: on Linux this is a soname (e.g. libopus.so.0), not a file path,
+    # so the dynamic loader resolves it; rediscover only if loading fails
+    cached_path = _read_cached_opus_path()
+    if cached_path:
         try:
-            if sys.platform == 'darwin':
-                discord.opus.load_opus("/opt/homebrew/lib/libopus.dylib")
-            elif sys.platform == 'win32':
-                discord.opus.load_opus("libopus-0.dll")
-            elif sys.platform == 'linux':
-                import ctypes.util
-
-                lib_name = "opus"
-                lib_path = ctypes.util.find_library(lib_name)
-                if lib_path:
-                    discord.opus.load_opus(lib_path)
-                else:
-                    print("Could not find opus library using ctypes.util.find_library")
+            discord.opus.load_opus(cached_path)
+            return
         except Exception as e:
-            print(f"Could not load opus from default path: {e}")
+            print(f"Failed to load cached opus path {cached_path}: {e}")
+
+    try:
+        lib_path = system_path
+        if lib_path is None and sys.platform == 'linux':
+            import ctypes.util
+
+            lib_path = ctypes.util.find_library("opus")
+            if not lib_path:
+                print("Could not find opus library using ctypes.util.find_library")
+        if lib_path:
+            discord.opus.load_opus(lib_path)
+            # Only discovery is worth caching; the _OPUS_NAMES paths are constants
+            if lib_path != system_path:
+                _write_cached_opus_path(lib_path)
+    except Exception as e:
+        print(f"Could not load opus from default path: {e}")
+
+load_opus_library()
 
 debug_guilds = [int(GUILD_ID)] if GUILD_ID else None
 bot = commands.Bot(command_prefix='/', intents=intents, debug_guilds=debug_guilds)
@@ -149,35 +254,51 @@ async def on_voice_state_update(member, before, after):
         if after.channel is None:
              print(f"[{member.guild.id}] Bot disconnected from voice. Cleaning up session...")
              await session_manager.cleanup_session(member.guild.id, skip_final=True)
+        elif before.channel != after.channel:
+            session = session_manager.sessions.get(member.guild.id)
+            if session:
+                session.recount_members()
         return
 
-    # 2. Check for users leaving
-    # Only care about users leaving a channel
-    if before.channel is None:
+    # 2. Track occupancy of the channel being recorded (no member list scans)
+    if member.bot or before.channel == after.channel:
         return
-    
-    # Check if the bot is in the channel the user left
-    voice_client = member.guild.voice_client
-    if not voice_client or not voice_client.is_connected():
+
+    session = session_manager.sessions.get(member.guild.id)
+    if not session or not session.voice_client or not session.voice_client.is_connected():
         return
-    
-    if voice_client.channel != before.channel:
+
+    channel = session.voice_client.channel
+    if after.channel == channel:
+        session.human_count += 1
         return
-    
-    # Count non-bot members remaining in the channel
-    remaining_members = [m for m in before.channel.members if not m.bot]
-    
-    if len(remaining_members) == 0:
+    if before.channel != channel:
+        return
+
+    session.human_count = max(0, session.human_count - 1)
+    if session.human_count == 0:
+        # The counter can drift after a reconnect or a missed event; confirm
+        # against the channel before throwing the session's audio away
+        session.recount_members()
+    if session.human_count == 0:
         print(f"[{member.guild.id}] All users left voice channel. Auto-stopping...")
         # Try to notify if possible
-        session = session_manager.get_session(member.guild.id)
-        if session and session.target_text_channel:
+        if session.target_text_channel:
             try:
                 await session.target_text_channel.send("👋 全員がボイスチャンネルから退出したため、自動的に分析を終了しました。")
-            except:
+            except discord.HTTPException:
                 pass
         await session_manager.cleanup_session(member.guild.id, skip_final=True)
 
+@bot.event
+async def on_member_update(before, after):
+    """Keep the session's cached display names current (fires only with the members intent)."""
+    if before.display_name == after.display_name:
+        return
+    session = session_manager.sessions.get(after.guild.id)
+    if session and after.id in session.user_display_names:
+        session.user_display_names[after.id] = after.display_name
+
 # --- Settings Commands ---
 settings_group = bot.create_group("settings", "Botの設定を変更します")
 
@@ -205,6 +326,19 @@ async def set_apikey(ctx, api_key: str):
         await ctx.respond("❌ 無効なAPIキーの形式です。正しいキーを入力してください。", ephemeral=True)
         return
         
+    # Validate against the API once here, the first time the key is used
+    await ctx.defer(ephemeral=True)
+    loop = asyncio.get_running_loop()
+    try:
+        valid = await loop.run_in_executor(None, validate_gemini_key, api_key)
+    except Exception as e:
+        print(f"Gemini key validation failed: {e}")
+        await ctx.respond("⚠️ APIキーを確認できませんでした（通信エラー）。しばらくしてから再度お試しください。", ephemeral=True)
+        return
+    if not valid:
+        await ctx.respond("❌ APIキーの確認に失敗しました。キーが正しいか確認してください。", ephemeral=True)
+        return
+
     set_user_key(ctx.author.id, api_key)
     await ctx.respond("✅ APIキーを保存しました！\n以後、あなたがコマンドを実行するとこのキーが自動で使用されます。", ephemeral=True)
 
@@ -241,20 +375,21 @@ async def analyze_start(ctx):
         
         # Get Current Settings
         settings = get_guild_settings(ctx.guild.id)
-        mode = settings.get('analysis_mode', 'debate')
-        interval = settings.get('recording_interval', 300)
+        mode = settings.analysis_mode
+        interval = settings.recording_interval
         interval_mins = interval // 60
         
         msg_text = (
             f"👥｜**{channel.name}** の分析を開始しました。\n"
             f"プライバシー保護のため、録音・分析が行われることを参加者に周知してください。\n"
-            f"`[設定] 間隔: {interval_mins}分 / モード: {mode}`\n\n"
-            f"⏳ 次のレポート出力まで: 約 {interval_mins}分"
+            f"`[設定] 間隔: {interval_mins}分 / モード: {mode}`"
         )
-        initial_message = await ctx.followup.send(msg_text)
+        await ctx.followup.send(msg_text)
+        # Separate message so countdown edits only ever replace this one line
+        countdown_message = await ctx.channel.send(COUNTDOWN_TEXT.format(interval_mins))
         
-        # Start Recording via Session (Pass API Key and Initial Message)
-        await session.start_recording(voice_client, ctx.channel, api_key=user_key, initial_message=initial_message)
+        # Start Recording via Session (Pass API Key and Countdown Message)
+        await session.start_recording(voice_client, ctx.channel, api_key=user_key, countdown_message=countdown_message)
             
     except Exception as e:
         # Cleanup if connection failed
@@ -309,10 +444,37 @@ async def analyze_stop_final(ctx):
     else:
         await ctx.followup.send("分析は実行されていません。")
 
+def setup_logging(level=logging.INFO):
+    """
+    Routes log records through a queue so the thread emitting them never
+    blocks on stdout; a background listener does the actual writes.
+    """
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    # Third-party loggers (httpx request lines, py-cord gateway chatter) stay at
+    # WARNING; only the bot's own modules log at `level`
+    root = logging.getLogger()
+    root.setLevel(logging.WARNING)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    logging.getLogger("insight_bot").setLevel(level)
+    return listener
+
 def run_bot():
+    setup_logging()
+    # Initialize Database (here rather than at import so importing the module has no side effects)
+    init_db()
+    init_user_db()
     token = setup_credentials()
     if token:
-        bot.run(token)
+        try:
+            bot.run(token)
+        finally:
+            session_manager.shutdown()
     else:
         print("No token provided. Exiting.")
 
@@ -0,0 +1,36 @@
+import threading
+import importlib.util
+from functools import lru_cache
+import httpx
+from google import genai
+from google.genai import types
+from .env import get_api_key
+
+# HTTP/2 needs the optional h2 package (httpx[http2] in requirements.txt): many
+# concurrent requests share one multiplexed connection. google-genai has no gRPC
+# transport, so this is the cheapest framing available. Without h2 the pools
+# still keep HTTP/1.1 connections alive.
+_HTTP2 = importlib.util.find_spec("h2") is not None
+_LIMITS = httpx.Limits(max_keepalive_connections=50, max_connections=100)
+_LOCK = threading.Lock()
+
+def _http_options():
+    # Native httpx transports for both sync and async calls (the async side
+    # otherwise falls back to running sync requests in threads)
+    return types.HttpOptions(
+        client_args={"transport": httpx.HTTPTransport(http2=_HTTP2, retries=2, limits=_LIMITS)},
+        async_client_args={"transport": httpx.AsyncHTTPTransport(http2=_HTTP2, retries=2, limits=_LIMITS)},
+    )
+
+@lru_cache(maxsize=32)
+def _client_for(api_key):
+    return genai.Client(api_key=api_key, http_options=_http_options())
+
+def get_client(api_key=None):
+    """
+    Shared genai.Client per API key (default: GEMINI_API_KEY from .env), so
+    repeated calls reuse its pooled HTTP connections instead of new TLS handshakes.
+    """
+    # The lock keeps two threads from building (and pooling) duplicate clients for a new key
+    with _LOCK:
+        return _client_for(api_key or get_api_key())
@@ -12,11 +12,28 @@ GUILD_ID = os.getenv('GUILD_ID')
 RECORDING_INTERVAL = 300  
 SAMPLE_RATE = 48000
 CHANNELS = 2
+# Intervals with less buffered PCM than this are skipped (~0.5s of 48k stereo s16le)
+SILENT_PCM_THRESHOLD = 100 * 1024  # bytes
+# Analyze early once this much PCM is buffered across all users
+MAX_BUFFERED_PCM_BYTES = 100 * 1024 * 1024  # bytes
+BUFFER_CHECK_INTERVAL = 60  # seconds between buffered-size checks while waiting
+COUNTDOWN_EDIT_INTERVAL = 300  # minimum seconds between countdown message edits
+FINAL_ANALYSIS_TIMEOUT = 120  # seconds /stop waits for the last report before disconnecting
+
+# Context carried between analyses
+CONTEXT_RECENT_REPORTS = 4  # latest reports whose tails are kept verbatim
+CONTEXT_RECENT_CHARS = 500  # per report, cut on a line boundary (4 x 500 = the old 2000-char window)
+CONTEXT_GIST_MAX_CHARS = 2000  # older context, summarized once it grows past this
 
 # Models
 GEMINI_MODEL_FLASH = "gemini-2.5-flash"
 GEMINI_MODEL_PRO = "gemini-2.5-pro"
 GEMINI_MODEL_DEFAULT = GEMINI_MODEL_FLASH
 
+# Cache
+VALIDATION_CACHE_TTL = 3600  # seconds a successfully validated credential is trusted
+MODEL_LIST_CACHE_TTL = 24 * 3600  # seconds; the model list changes on the order of weeks
+
 # Paths
 TEMP_AUDIO_DIR = "temp_audio"
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "insight_bot")
@@ -1,84 +1,136 @@
 import sqlite3
 import os
+import time
+import atexit
+import threading
+from dataclasses import dataclass
+from typing import Optional
 
 DB_PATH = "bot_settings.db"
 
+# Single shared connection. It is used from the event loop and from executor
+# threads, so every access goes through _LOCK.
+_CONN = None
+_LOCK = threading.RLock()
+
+# Same order as the GuildSettings fields after guild_id
+GUILD_SETTING_COLUMNS = ('api_key', 'analysis_mode', 'recording_interval')
+
+# Guild settings change rarely; keep them in memory for a short while
+SETTINGS_CACHE_TTL = 30  # seconds
+_SETTINGS_CACHE = {}  # {guild_id: (expires_at, settings)}
+
+@dataclass(frozen=True, slots=True)
+class GuildSettings:
+    """One guild's settings row. Frozen, so the cached instance can be shared safely."""
+    guild_id: int
+    api_key: Optional[str] = None
+    analysis_mode: str = 'debate'
+    recording_interval: int = 300
+
 def get_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    global _CONN
+    with _LOCK:
+        if _CONN is None:
+            # Plain tuple rows: every query selects explicit columns and unpacks by position
+            # Default rollback journal: docker-compose mounts only the db file itself,
+            # so a WAL (and every write still in it) would be lost with the container
+            _CONN = sqlite3.connect(DB_PATH, check_same_thread=False)
+        return _CONN
+
+def close_connection():
+    global _CONN
+    with _LOCK:
+        if _CONN is not None:
+            _CONN.close()
+            _CONN = None
+
+atexit.register(close_connection)
 
 def init_db():
     conn = get_connection()
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS guild_settings (
-            guild_id INTEGER PRIMARY KEY,
-            api_key TEXT,
-            analysis_mode TEXT DEFAULT 'debate',
-            recording_interval INTEGER DEFAULT 300
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    with _LOCK:
+        c = conn.cursor()
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS guild_settings (
+                guild_id INTEGER PRIMARY KEY,
+                api_key TEXT,
+                analysis_mode TEXT DEFAULT 'debate',
+                recording_interval INTEGER DEFAULT 300
+            )
+        ''')
+        # Left behind by the removed answer and uploaded-file caches
+        c.execute('DROP TABLE IF EXISTS answer_cache')
+        c.execute('DROP TABLE IF EXISTS remote_files')
+        conn.commit()
 
 def get_guild_settings(guild_id):
+    cached = _SETTINGS_CACHE.get(guild_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    settings = _get_guild_settings_uncached(guild_id)
+    _SETTINGS_CACHE[guild_id] = (time.monotonic() + SETTINGS_CACHE_TTL, settings)
+    return settings
+
+def invalidate_guild_settings(guild_id):
+    """Drops the cached settings so the next read goes to the database."""
+    _SETTINGS_CACHE.pop(guild_id, None)
+
+def _get_guild_settings_uncached(guild_id):
     conn = get_connection()
-    c = conn.cursor()
-    c.execute('SELECT * FROM guild_settings WHERE guild_id = ?', (guild_id,))
-    row = c.fetchone()
-    conn.close()
+    with _LOCK:
+        c = conn.cursor()
+        c.execute(f'SELECT {", ".join(GUILD_SETTING_COLUMNS)} FROM guild_settings WHERE guild_id = ?', (guild_id,))
+        row = c.fetchone()
     if row:
-        return dict(row)
+        return GuildSettings(guild_id, *row)
     else:
         # Return defaults if not found
-        return {
-            'guild_id': guild_id,
-            'api_key': None,
-            'analysis_mode': 'debate',
-            'recording_interval': 300
-        }
+        return GuildSettings(guild_id)
 
 def update_guild_setting(guild_id, key, value):
-    settings = get_guild_settings(guild_id)
-    settings[key] = value
-    
+    if key not in GUILD_SETTING_COLUMNS:
+        raise ValueError(f"Unknown guild setting: {key}")
+
+    # Single UPSERT: untouched columns keep their value (or the table default)
     conn = get_connection()
-    c = conn.cursor()
-    c.execute('''
-        INSERT OR REPLACE INTO guild_settings (guild_id, api_key, analysis_mode, recording_interval)
-        VALUES (?, ?, ?, ?)
-    ''', (guild_id, settings['api_key'], settings['analysis_mode'], settings['recording_interval']))
-    conn.commit()
-    conn.close()
+    with _LOCK:
+        c = conn.cursor()
+        c.execute(f'''
+            INSERT INTO guild_settings (guild_id, {key}) VALUES (?, ?)
+            ON CONFLICT(guild_id) DO UPDATE SET {key} = excluded.{key}
+        ''', (guild_id, value))
+        conn.commit()
+    invalidate_guild_settings(guild_id)
 
 def init_user_db():
     conn = get_connection()
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS user_keys (
-            user_id INTEGER PRIMARY KEY,
-            api_key TEXT,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    with _LOCK:
+        c = conn.cursor()
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS user_keys (
+                user_id INTEGER PRIMARY KEY,
+                api_key TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.commit()
 
 def get_user_key(user_id):
     conn = get_connection()
-    c = conn.cursor()
-    c.execute('SELECT api_key FROM user_keys WHERE user_id = ?', (user_id,))
-    row = c.fetchone()
-    conn.close()
-    return row['api_key'] if row else None
+    with _LOCK:
+        c = conn.cursor()
+        c.execute('SELECT api_key FROM user_keys WHERE user_id = ?', (user_id,))
+        row = c.fetchone()
+    return row[0] if row else None
 
 def set_user_key(user_id, api_key):
     conn = get_connection()
-    c = conn.cursor()
-    c.execute('''
-        INSERT OR REPLACE INTO user_keys (user_id, api_key, updated_at)
-        VALUES (?, ?, CURRENT_TIMESTAMP)
-    ''', (user_id, api_key))
-    conn.commit()
-    conn.close()
+    with _LOCK:
+        c = conn.cursor()
+        c.execute('''
+            INSERT OR REPLACE INTO user_keys (user_id, api_key, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+        ''', (user_id, api_key))
+        conn.commit()
@@ -0,0 +1,16 @@
+import os
+from functools import lru_cache
+from dotenv import load_dotenv
+
+@lru_cache(maxsize=1)
+def get_api_key():
+    """
+    GEMINI_API_KEY for the helper scripts. The .env files are parsed once per
+    process, however many scripts/modules ask for the key.
+    """
+    load_dotenv("insight_bot/.env")
+    load_dotenv()
+    key = os.getenv("GEMINI_API_KEY")
+    if not key:
+        raise RuntimeError("GEMINI_API_KEY not found in environment.")
+    return key
@@ -0,0 +1,43 @@
+import os
+import json
+import time
+import hashlib
+from .config import CACHE_DIR, MODEL_LIST_CACHE_TTL
+
+def _cache_path(api_key):
+    # One file per key (hashed), so users sharing a machine never see each other's list
+    key_hash = hashlib.sha256((api_key or "").encode()).hexdigest()
+    return os.path.join(CACHE_DIR, key_hash, "models.json")
+
+def load_cached_models(api_key, ttl=MODEL_LIST_CACHE_TTL):
+    """
+    Returns the cached model list ([{name, display_name, supported_actions}])
+    if it is younger than ttl, else None.
+    """
+    path = _cache_path(api_key)
+    try:
+        if time.time() - os.stat(path).st_mtime >= ttl:
+            return None
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_cached_models(api_key, models):
+    """Stores SDK Model objects (or already-converted dicts) for load_cached_models."""
+    entries = [
+        m if isinstance(m, dict) else {
+            "name": m.name,
+            "display_name": m.display_name,
+            "supported_actions": list(m.supported_actions or []),
+        }
+        for m in models
+    ]
+    path = _cache_path(api_key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(entries, f)
+    except OSError as e:
+        print(f"Could not write model list cache: {e}")
+    return entries
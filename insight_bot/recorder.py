@@ -7,17 +7,22 @@ class UserSpecificSink(discord.sinks.Sink):
     """
     Records raw PCM audio for each user separately.
     """
-    def __init__(self, *args, **kwargs):
+    def __init__(self, guild_id, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.timestamp = int(time.time())
+        # Every temp file of this recording starts with this; the guild id keeps
+        # two guilds that start in the same second from sharing (and deleting) files
+        self.file_prefix = f"{guild_id}_{self.timestamp}_"
+        # PCM bytes received since the last flush; bumped from the voice recv thread
+        self._bytes_since_flush = 0
         if not os.path.exists(TEMP_AUDIO_DIR):
             os.makedirs(TEMP_AUDIO_DIR)
 
-    def write(self, user, data):
-        # Print a dot for every packet to show activity in terminal
-        print(f".", end="", flush=True)
+    def write(self, data, user):
+        # py-cord calls sink.write(decoded_pcm, user_id), matching Sink.write(self, data, user)
+        self._bytes_since_flush += len(data)
         # The base Sink.write method appends the data (which is raw PCM) to self.audio_data[user_id]
-        super().write(user, data)
+        super().write(data, user)
 
     def write_user_audio(self, user_id, audio_data):
         pass
@@ -33,39 +38,40 @@ class UserSpecificSink(discord.sinks.Sink):
     def get_user_audio(self, user_id):
         return self.audio_data.get(user_id)
 
+    def buffered_bytes(self):
+        """
+        PCM bytes received since the last flush (an O(1) counter read).
+        May slightly overcount around a flush, never undercount.
+        """
+        return self._bytes_since_flush
+
+    def mp3_path_for(self, user_id):
+        """Temp path for one user's encoded chunk (prefixed with file_prefix for cleanup)."""
+        return f"{TEMP_AUDIO_DIR}/{self.file_prefix}{user_id}_{int(time.time())}.mp3"
+
     async def flush_audio(self):
         """
-        Saves current buffer to disk and clears it to free memory.
-        Returns a map of {user_id: file_path}.
-        Saves as .pcm (raw signed 16-bit little-endian, 48k stereo).
+        Detaches the current buffers so recording continues into fresh ones.
+        Returns a map of {user_id: BytesIO} holding raw PCM
+        (signed 16-bit little-endian, 48k stereo); empty buffers are dropped.
+        Nothing is written to disk here: the caller pipes the PCM straight to ffmpeg.
         """
-        saved_files = {}
+        # Reset before popping: packets arriving in between are counted twice rather than lost
+        self._bytes_since_flush = 0
+        popped = {}
         # Use a list of keys to avoid runtime modification issues during iteration
-        # simple iteration over keys() is fine if we use pop with default or standard logic
         user_ids = list(self.audio_data.keys())
         
         for user_id in user_ids:
             # Atomic-ish pop. The recv thread might re-create this entry immediately if a packet arrives,
             # which is fine (that's the next chunk).
-            if user_id in self.audio_data:
-                audio = self.audio_data.pop(user_id)
-            else:
+            audio = self.audio_data.pop(user_id, None)
+            if audio is None:
                 continue
 
             # audio is an AudioData object (which wraps BytesIO in .file)
-            if hasattr(audio, 'file'):
-                 audio_file = audio.file
-            else:
-                 audio_file = audio
+            audio_file = getattr(audio, 'file', audio)
+            if audio_file.tell() > 0:
+                popped[user_id] = audio_file
 
-            # Check if there's data
-            try:
-                if audio_file.getbuffer().nbytes > 0:
-                    filename = f"{TEMP_AUDIO_DIR}/{self.timestamp}_{user_id}_{int(time.time())}.pcm"
-                    with open(filename, "wb") as f:
-                        f.write(audio_file.getbuffer())
-                    saved_files[user_id] = filename
-            except Exception as e:
-                print(f"Error saving audio for user {user_id}: {e}")
-        
-        return saved_files
+        return popped
@@ -0,0 +1,38 @@
+import sys
+import atexit
+import logging
+from logging.handlers import MemoryHandler
+
+class _BatchedStdoutHandler(MemoryHandler):
+    """
+    Holds records in memory and writes them to stdout in a single write when
+    the buffer fills, an ERROR arrives, or the process exits.
+    """
+    def flush(self):
+        with self.lock:
+            if self.buffer:
+                sys.stdout.write("".join(self.format(r) + "\n" for r in self.buffer))
+                sys.stdout.flush()
+                self.buffer.clear()
+
+_HANDLER = None
+
+def setup_script_logging(name="inspect", capacity=1024):
+    """Logger for the helper scripts; output is batched instead of one write per line."""
+    global _HANDLER
+    if _HANDLER is None:
+        _HANDLER = _BatchedStdoutHandler(capacity, flushLevel=logging.ERROR)
+        _HANDLER.setFormatter(logging.Formatter("%(message)s"))
+        # Library loggers (e.g. httpx's per-request lines) stay at WARNING
+        root = logging.getLogger()
+        root.setLevel(logging.WARNING)
+        root.addHandler(_HANDLER)
+        atexit.register(_HANDLER.flush)
+    log = logging.getLogger(name)
+    log.setLevel(logging.INFO)
+    return log
+
+def flush_script_log():
+    """Writes out anything buffered so far (e.g. before streaming output directly)."""
+    if _HANDLER is not None:
+        _HANDLER.flush()
@@ -1,36 +1,71 @@
+import io
 import os
 import asyncio
+import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Optional
 import discord
 from discord.ext import tasks
 from .recorder import UserSpecificSink
-from .audio_processor import convert_to_mp3, cleanup_files
-from .analyzer import analyze_discussion
+from .audio_processor import aencode_all_pcm_to_mp3, acleanup_files, acleanup_temp_dir
+from .analyzer import analyze_discussion, summarize_context
 from .database import get_guild_settings
+from .config import CONTEXT_RECENT_REPORTS, CONTEXT_RECENT_CHARS, CONTEXT_GIST_MAX_CHARS, SILENT_PCM_THRESHOLD, MAX_BUFFERED_PCM_BYTES, BUFFER_CHECK_INTERVAL, COUNTDOWN_EDIT_INTERVAL, FINAL_ANALYSIS_TIMEOUT
+
+COUNTDOWN_TEXT = "⏳ 次のレポート出力まで: 約 {}分"
+# analyze_discussion results that are not a report (str.startswith takes the tuple in one call)
+_REPORT_SILENT_PREFIX = "音声データがありません"
+_REPORT_ERROR_PREFIXES = ("⚠️", "❌")
+_REPORT_SKIP_PREFIXES = (_REPORT_SILENT_PREFIX, *_REPORT_ERROR_PREFIXES)
+JST = datetime.timezone(datetime.timedelta(hours=9))
+
+def _report_tail(report, max_chars):
+    """End of a report, at most max_chars long, starting on a line boundary."""
+    if len(report) <= max_chars:
+        return report
+    start = report.find("\n", len(report) - max_chars)
+    if start == -1:
+        return report[-max_chars:]
+    return report[start + 1:]
 
 class GuildSession:
-    def __init__(self, guild_id: int, bot):
+    def __init__(self, guild_id: int, bot, manager: "SessionManager"):
         self.guild_id = guild_id
         self.bot = bot
+        # Owns the executors shared by every guild
+        self.manager = manager
         self.voice_client: Optional[discord.VoiceClient] = None
         self.active_sink: Optional[UserSpecificSink] = None
         self.target_text_channel: Optional[discord.TextChannel] = None
-        self.last_context = ""
+        self.recent_reports = deque(maxlen=CONTEXT_RECENT_REPORTS)
+        self.context_gist = ""
+        self.gist_task: Optional[asyncio.Task] = None
+        # Strong refs to fire-and-forget tasks so they aren't garbage collected mid-run
+        self.background_tasks = set()
         self.task: Optional[asyncio.Task] = None
+        # Non-bot members in the recorded voice channel, kept up to date by on_voice_state_update
+        self.human_count = 0
+        # user_id -> display name, filled lazily so fetch_user runs at most once per user
+        self.user_display_names: Dict[int, str] = {}
         self.settings = get_guild_settings(guild_id)
 
-    async def start_recording(self, voice_client, channel, api_key=None, initial_message=None):
+    async def start_recording(self, voice_client, channel, api_key=None, countdown_message=None):
         self.voice_client = voice_client
         self.target_text_channel = channel
-        self.active_sink = UserSpecificSink()
+        self.active_sink = UserSpecificSink(self.guild_id)
         self.api_key = api_key # Store the key
-        self.countdown_message = initial_message
+        self.countdown_message = countdown_message
+        self.recount_members()
         self.voice_client.start_recording(self.active_sink, self.finished_callback)
         
         # Start periodic task
         self.task = asyncio.create_task(self.process_loop())
 
-    # Removed corrupted block
+    def recount_members(self):
+        """Recounts non-bot members in the voice channel (on start, when the bot moves, and before an auto-stop)."""
+        channel = self.voice_client.channel if self.voice_client else None
+        self.human_count = sum(1 for m in channel.members if not m.bot) if channel else 0
 
 
     async def stop_recording(self, skip_final=False):
@@ -41,13 +76,27 @@ class GuildSession:
                 await self.task
             except asyncio.CancelledError:
                 pass
+            except Exception as e:
+                # A crashed loop must not prevent the disconnect below
+                print(f"[{self.guild_id}] Periodic task ended with error: {e}")
             self.task = None
 
         # 2. Perform Final Analysis (unless skipped)
         if not skip_final and self.voice_client and self.voice_client.is_connected() and self.active_sink:
             if self.target_text_channel:
                  await self.target_text_channel.send("🔄 終了前の最終分析を行っています...しばらくお待ちください。")
-            await self.perform_analysis(is_final=True)
+            try:
+                # Bound shutdown latency: a stuck upload/generation must not keep the bot in the channel
+                await asyncio.wait_for(self.perform_analysis(is_final=True), timeout=FINAL_ANALYSIS_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"[{self.guild_id}] Final analysis timed out after {FINAL_ANALYSIS_TIMEOUT}s.")
+                if self.target_text_channel:
+                    await self.target_text_channel.send("⚠️ 最終分析がタイムアウトしたため、レポートなしで終了します。")
+
+        # No further analysis will read the context, so a pending summary is moot
+        if self.gist_task and not self.gist_task.done():
+            self.gist_task.cancel()
+        self.gist_task = None
 
         # 3. Stop recording and disconnect
         # Try to get voice client from bot/guild if not tracked in session
@@ -56,21 +105,25 @@ class GuildSession:
             if guild:
                 self.voice_client = guild.voice_client
 
-        if self.voice_client:
-            if self.voice_client.recording:
-                self.voice_client.stop_recording()
-            if self.voice_client.is_connected():
-                await self.voice_client.disconnect()
-        
-        self.voice_client = None
-        self.active_sink = None
+        try:
+            if self.voice_client:
+                if self.voice_client.recording:
+                    self.voice_client.stop_recording()
+                if self.voice_client.is_connected():
+                    await self.voice_client.disconnect()
+        finally:
+            self.voice_client = None
+            self.active_sink = None
 
     async def finished_callback(self, sink, *args):
-        # Ensure any remaining audio is flushed (best effort)
+        # Drop any remaining buffered audio (best effort)
+        # CancelledError is deliberately not caught so stop_recording's cancellation propagates
         try:
              await sink.flush_audio()
-        except:
-             pass
+        except Exception as e:
+             print(f"[{self.guild_id}] Failed to drop remaining audio: {e}")
+        # Remove every temp file this recording produced
+        await acleanup_temp_dir(sink.file_prefix)
 
     async def process_loop(self):
         await self.bot.wait_until_ready()
@@ -78,37 +131,35 @@ class GuildSession:
         while True:
             # Dynamic interval from settings
             self.settings = get_guild_settings(self.guild_id)
-            interval = self.settings.get('recording_interval', 300)
-            remaining_seconds = interval
+            interval = self.settings.recording_interval
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + interval
+            last_edit = loop.time()
+            shown_minutes = interval // 60
             
-            # Loop for countdown
-            while remaining_seconds > 0:
+            # Sleep until the absolute deadline. Waking up is cheap (a local buffer
+            # check); the Discord edit is throttled to COUNTDOWN_EDIT_INTERVAL.
+            while (remaining_seconds := deadline - loop.time()) > 0:
                 try:
-                    # Determine sleep time (up to 60 seconds)
-                    sleep_time = min(60, remaining_seconds)
-                    await asyncio.sleep(sleep_time)
-                    remaining_seconds -= sleep_time
+                    await asyncio.sleep(min(BUFFER_CHECK_INTERVAL, remaining_seconds))
+                    remaining_seconds = deadline - loop.time()
+
+                    # Back-pressure: analyze early if a lot of audio has piled up
+                    if self.active_sink and self.active_sink.buffered_bytes() >= MAX_BUFFERED_PCM_BYTES:
+                        print(f"[{self.guild_id}] Buffered audio over limit, analyzing early.")
+                        break
+
+                    remaining_minutes = max(1, int(remaining_seconds // 60))
+                    if remaining_minutes == shown_minutes or loop.time() - last_edit < COUNTDOWN_EDIT_INTERVAL:
+                        continue
                     
-                    # Edit the countdown message
+                    # Edit the countdown message (it holds only the countdown line)
                     if self.countdown_message and remaining_seconds > 0:
                         try:
-                            remaining_minutes = max(1, remaining_seconds // 60)
-                            
-                            # Keep the original content but update the countdown line
-                            # We replace the last line or append if missing
-                            content = self.countdown_message.content
-                            
-                            # Replace the last line using simple substring logic assumes specific format
-                            lines = content.split('\n')
-                            new_lines = []
-                            for line in lines:
-                                if "⏳ 次のレポート出力まで:" not in line:
-                                    new_lines.append(line)
-                                    
-                            new_lines.append(f"⏳ 次のレポート出力まで: 約 {remaining_minutes}分")
-                            new_content = '\n'.join(new_lines)
-                            
-                            await self.countdown_message.edit(content=new_content)
+                            # Counted even if the edit fails, so errors are not retried every tick
+                            last_edit = loop.time()
+                            await self.countdown_message.edit(content=COUNTDOWN_TEXT.format(remaining_minutes))
+                            shown_minutes = remaining_minutes
                         except discord.NotFound:
                             # Message was probably deleted by a user, ignore
                             self.countdown_message = None
@@ -118,44 +169,142 @@ class GuildSession:
                 except asyncio.CancelledError:
                     return
 
+            # Nothing (or almost nothing) was said: skip ffmpeg, uploads and the Gemini call.
+            # The little audio there is stays buffered for the next cycle.
+            if self.active_sink and self.active_sink.buffered_bytes() < SILENT_PCM_THRESHOLD:
+                print(f"[{self.guild_id}] Skipping silent interval.")
+                # Restart the countdown like a report would; edits are throttled, so a stale
+                # value would otherwise stay up for most of the next cycle
+                # (shown_minutes is reset to interval // 60 at the top of the loop)
+                if self.countdown_message:
+                    try:
+                        await self.countdown_message.edit(content=COUNTDOWN_TEXT.format(interval // 60))
+                    except discord.NotFound:
+                        self.countdown_message = None
+                    except Exception as e:
+                        print(f"[{self.guild_id}] Failed to reset countdown message: {e}")
+                continue
+
             # Wait for analysis to complete
             await self.perform_analysis(is_final=False)
             
-            # After analysis is complete (report or error message posted), remove the countdown line from the old message
+            # After analysis is complete (report or error message posted), remove the old countdown
             if self.countdown_message:
                 try:
-                    content = self.countdown_message.content
-                    lines = content.split('\n')
-                    new_lines = [line for line in lines if "⏳ 次のレポート出力まで:" not in line]
-                    new_content = '\n'.join(new_lines).strip()
-                    
-                    if not new_content:
-                        # If the message only contained the countdown, delete it entirely
-                        await self.countdown_message.delete()
-                    else:
-                        # Otherwise, edit it to remove the countdown line
-                        await self.countdown_message.edit(content=new_content)
+                    await self.countdown_message.delete()
                 except discord.NotFound:
                     pass
                 except Exception as e:
-                    print(f"[{self.guild_id}] Failed to remove countdown text: {e}")
+                    print(f"[{self.guild_id}] Failed to remove countdown message: {e}")
                 finally:
                     self.countdown_message = None
             
             # After analysis, post a new countdown message for the next cycle
             if self.target_text_channel:
                 try:
-                    interval_mins = interval // 60
-                    self.countdown_message = await self.target_text_channel.send(f"⏳ 次のレポート出力まで: 約 {interval_mins}分")
+                    self.countdown_message = await self.target_text_channel.send(COUNTDOWN_TEXT.format(interval // 60))
                 except Exception as e:
                      print(f"[{self.guild_id}] Failed to send new countdown message: {e}")
 
+    def spawn_background(self, coro):
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
+
+    def build_context(self):
+        """Context passed to the analyzer: summarized older history + tails of the latest reports."""
+        return "\n".join(c for c in (self.context_gist, *self.recent_reports) if c)
+
+    def update_context(self, report):
+        """
+        Keeps the tail of the new report; the oldest one falling out of the
+        deque is folded into the gist. When the gist grows too long it is
+        truncated right away and summarized in the background, so the next
+        analysis never waits on it.
+        """
+        if len(self.recent_reports) == self.recent_reports.maxlen:
+            self._fold_into_gist(self.recent_reports[0])
+        self.recent_reports.append(_report_tail(report, CONTEXT_RECENT_CHARS))
+
+    def _fold_into_gist(self, text):
+        older = "\n".join(c for c in (self.context_gist, text) if c)
+        if len(older) <= CONTEXT_GIST_MAX_CHARS:
+            self.context_gist = older
+            return
+
+        self.context_gist = older[-CONTEXT_GIST_MAX_CHARS:]
+        # spawn_background keeps a strong reference even after gist_task is replaced
+        self.gist_task = self.spawn_background(self._summarize_gist(older, self.context_gist))
+
+    async def _summarize_gist(self, older, placeholder):
+        loop = asyncio.get_running_loop()
+        gist = await loop.run_in_executor(self.manager.analysis_executor, summarize_context, older, self.api_key)
+        # Only replace the truncated gist if no newer report has been folded in meanwhile
+        if gist and self.context_gist == placeholder:
+            self.context_gist = gist[:CONTEXT_GIST_MAX_CHARS]
+
     async def force_analysis(self):
         """Manually trigger an analysis right now."""
         # Simple implementation: just run perform_analysis.
         # This acts independently of the periodic loop.
         await self.perform_analysis(is_final=False)
 
+    async def _fetch_members(self, guild, user_ids):
+        """
+        Resolves users missing from the local caches.
+        With the members intent this is a single gateway query; otherwise
+        the fetch_user calls run concurrently instead of one after another.
+        """
+        if guild and self.bot.intents.members:
+            try:
+                # The gateway accepts at most 100 ids per request
+                return await guild.query_members(user_ids=user_ids[:100], limit=min(len(user_ids), 100))
+            except Exception as e:
+                print(f"[{self.guild_id}] query_members failed, falling back to fetch_user: {e}")
+
+        results = await asyncio.gather(*(self.bot.fetch_user(uid) for uid in user_ids), return_exceptions=True)
+        return [r for r in results if not isinstance(r, BaseException)]
+
+    async def _open_report_thread(self, title_text, embed_color, thread_name):
+        """Posts the starter embed (placeholder until the report is ready) and opens its thread."""
+        embed = discord.Embed(title=title_text, description="⏳ 分析中です...", color=embed_color)
+        starter_msg = await self.target_text_channel.send(embed=embed)
+        report_thread = await starter_msg.create_thread(name=thread_name, auto_archive_duration=60)
+        return starter_msg, report_thread
+
+    async def _discard_report_thread(self, thread_task, note):
+        """
+        Removes the placeholder thread and message when no report will be posted.
+        Deleting the thread needs Manage Threads; without it the placeholder is
+        kept, shows `note` and its thread is archived, so nothing is orphaned.
+        Returns True if `note` still has to be posted elsewhere.
+        """
+        try:
+            starter_msg, report_thread = await thread_task
+        except Exception:
+            # Creation failed (or was cancelled); nothing to remove
+            return True
+        try:
+            await report_thread.delete()
+        except discord.Forbidden:
+            try:
+                embed = starter_msg.embeds[0]
+                embed.description = note
+                await starter_msg.edit(embed=embed)
+                # The thread's creator may archive it without extra permissions
+                await report_thread.edit(archived=True)
+            except discord.HTTPException as e:
+                print(f"[{self.guild_id}] Failed to close placeholder report thread: {e}")
+            return False
+        except discord.HTTPException as e:
+            print(f"[{self.guild_id}] Failed to remove placeholder report thread: {e}")
+        try:
+            await starter_msg.delete()
+        except discord.HTTPException as e:
+            print(f"[{self.guild_id}] Failed to remove placeholder report message: {e}")
+        return True
+
     async def perform_analysis(self, is_final=False):
         """
         Manual/Periodic analysis trigger.
@@ -165,11 +314,18 @@ class GuildSession:
             return
 
         print(f"[{self.guild_id}] Starting analysis (Final: {is_final})...")
+        # Cached in database.py, so this is a dict lookup; picks up /settings changes right away
+        self.settings = get_guild_settings(self.guild_id)
         
+        # Nothing new since the last flush: skip flush, ffmpeg and the Gemini call entirely
+        if self.active_sink.buffered_bytes() < SILENT_PCM_THRESHOLD:
+            print(f"[{self.guild_id}] No new audio since last analysis (Final: {is_final}).")
+            return
+
         try:
-            user_files_raw = await self.active_sink.flush_audio()
+            user_buffers = await self.active_sink.flush_audio()
             
-            if not user_files_raw:
+            if not user_buffers:
                 if is_final:
                     print(f"[{self.guild_id}] No audio to analyze for final report.")
                 return
@@ -178,50 +334,50 @@ class GuildSession:
             user_map = {}
             try:
                 guild = self.voice_client.guild
-            except:
-                guild = None 
+            except AttributeError:
+                guild = None
             
-            for user_id in user_files_raw.keys():
-                member = None
-                if guild:
-                    member = guild.get_member(user_id)
-                
-                if not member:
-                    member = self.bot.get_user(user_id)
-                if not member:
-                    try:
-                        member = await self.bot.fetch_user(user_id)
-                    except:
-                        pass
-                
+            # Local caches first; whoever is left is fetched in one batch
+            missing = []
+            for user_id in user_buffers.keys():
+                if user_id in self.user_display_names:
+                    continue
+                member = (guild.get_member(user_id) if guild else None) or self.bot.get_user(user_id)
                 if member:
-                    user_map[user_id] = member.display_name
+                    self.user_display_names[user_id] = member.display_name
                 else:
-                    user_map[user_id] = f"User_{user_id}"
+                    missing.append(user_id)
+
+            if missing:
+                # Only successful lookups are cached; unknown users are retried next cycle
+                for member in await self._fetch_members(guild, missing):
+                    self.user_display_names[member.id] = member.display_name
+
+            for user_id in user_buffers.keys():
+                user_map[user_id] = self.user_display_names.get(user_id, f"User_{user_id}")
 
-            # Convert in Executor to avoid blocking event loop
+            # Pipe each user's PCM straight into ffmpeg (async subprocesses, all users at once)
             loop = asyncio.get_running_loop()
             user_files_mp3 = {}
             files_to_cleanup = []
             
-            for user_id, raw_path in user_files_raw.items():
-                # Run ffmpeg conversion in thread
-                mp3_path = await loop.run_in_executor(None, convert_to_mp3, raw_path)
+            user_ids = list(user_buffers.keys())
+            jobs = [(user_buffers[uid].getbuffer(), self.active_sink.mp3_path_for(uid)) for uid in user_ids]
+            mp3_paths = await aencode_all_pcm_to_mp3(jobs, self.manager.ffmpeg_executor)
+            for pcm, _ in jobs:
+                pcm.release()
+            user_buffers.clear()
+
+            for user_id, mp3_path in zip(user_ids, mp3_paths):
                 if mp3_path:
                     user_files_mp3[user_id] = mp3_path
-                    files_to_cleanup.append(raw_path)
                     files_to_cleanup.append(mp3_path)
             
             if not user_files_mp3:
-                cleanup_files(files_to_cleanup)
                 return
 
             # Thread Setup
-            import datetime
-            # JST is UTC+9
-            jst_delta = datetime.timedelta(hours=9)
-            now_jst = datetime.datetime.now(datetime.timezone.utc) + jst_delta
-            timestamp_str = now_jst.strftime("%Y-%m-%d %H:%M")
+            timestamp_str = datetime.datetime.now(JST).strftime("%Y-%m-%d %H:%M")
             
             if is_final:
                 thread_name = f"議論分析レポート (最終) {timestamp_str}"
@@ -230,57 +386,69 @@ class GuildSession:
                 thread_name = f"議論分析レポート {timestamp_str}"
                 header_prefix = "📊 **議論分析レポート**"
             
+            title_text = f"📅 自動分析 ({timestamp_str})"
+            embed_color = discord.Color.blue()
+            if is_final:
+                title_text = f"🛑 セッション終了 ({timestamp_str})"
+                embed_color = discord.Color.red()
+            
             try:
-                # 1. Analyze first (Heavy processing)
-                if self.target_text_channel:
+                # Pre-flight config before opening typing(), so a misconfigured guild
+                # doesn't trigger a typing request for an analysis that never runs
+                api_key = self.api_key
+                if not api_key:
+                    if self.target_text_channel:
+                        await self.target_text_channel.send("⚠️ エラー: APIキーが設定されていません。")
+                    return
+                mode = self.settings.analysis_mode
+
+                if not self.target_text_channel:
+                    return
+
+                # 1. Analyze (heavy) while the starter message and thread are created,
+                # so the Discord round-trips are hidden behind the Gemini call
+                thread_task = asyncio.create_task(self._open_report_thread(title_text, embed_color, thread_name))
+                try:
                     # Optional: Typing indicator in the main channel while analyzing
                     async with self.target_text_channel.typing():
-
-                        
-                        api_key = self.api_key
-                        if not api_key:
-                            if self.target_text_channel:
-                                await self.target_text_channel.send("⚠️ エラー: APIキーが設定されていません。")
-                            return
-                        
                         report = await loop.run_in_executor(
-                            None, 
+                            self.manager.analysis_executor, 
                             analyze_discussion, 
                             user_files_mp3, 
-                            self.last_context, 
+                            self.build_context(), 
                             user_map,
                             api_key,
-                            self.settings['analysis_mode']
+                            mode
                         )
+                except BaseException:
+                    await self._discard_report_thread(thread_task, "⚠️ 分析を完了できませんでした。")
+                    raise
                 
                 # Check for analysis errors or empty results
-                if not report or report.startswith("⚠️") or report.startswith("音声データがありません") or report.startswith("❌"):
+                if not report or report.startswith(_REPORT_SKIP_PREFIXES):
                      print(f"[{self.guild_id}] Analysis skipped or failed: {report}")
                      
                      # Notify user about silence or error
                      msg = ""
-                     if report.startswith("音声データがありません"):
+                     if report and report.startswith(_REPORT_SILENT_PREFIX):
                          msg = "🎤 音声が検出されませんでした（無音）。"
-                     elif report.startswith("⚠️") or report.startswith("❌"):
+                     elif report and report.startswith(_REPORT_ERROR_PREFIXES):
                          msg = f"⚠️ 分析エラー: {report}"
                      else:
                          msg = "⚠️ 予期せぬエラーでレポートを作成できませんでした。"
                      
-                     if self.target_text_channel:
+                     # Shown in the kept placeholder instead when the thread can't be deleted
+                     if await self._discard_report_thread(thread_task, msg):
                          await self.target_text_channel.send(msg)
-                         
-                         # If this was final, ensure we say goodbye even if no report
-                         if is_final:
-                              await self.target_text_channel.send("🛑 セッションを終了します。")
+                     
+                     # If this was final, ensure we say goodbye even if no report
+                     if is_final:
+                          await self.target_text_channel.send("🛑 セッションを終了します。")
                      return
 
-                # 2. Create Thread and Post Report
-                title_text = f"📅 自動分析 ({timestamp_str})"
-                embed_color = discord.Color.blue()
-                if is_final:
-                    title_text = f"🛑 セッション終了 ({timestamp_str})"
-                    embed_color = discord.Color.red()
-                
+                # 2. Fill in the preview and post the report into the ready thread
+                starter_msg, report_thread = await thread_task
+
                 # レポートのプレビューを作成 (最初の約300文字)
                 preview_length = 300
                 preview_text = report[:preview_length].strip()
@@ -292,22 +460,22 @@ class GuildSession:
                     description=f"{preview_text}\n*(全文はスレッドを開いてご確認ください)*",
                     color=embed_color
                 )
+                await starter_msg.edit(embed=embed)
+                
+                # Update Context
+                self.update_context(report)
 
-                if self.target_text_channel:
-                    starter_msg = await self.target_text_channel.send(embed=embed)
-                    report_thread = await starter_msg.create_thread(name=thread_name, auto_archive_duration=60)
-                    
-                    # Update Context
-                    self.last_context = report[-2000:]
-
-                    # Post Report
-                    header = f"{header_prefix}\n"
-                    if len(report) + len(header) < 2000:
-                        await report_thread.send(header + report)
-                    else:
-                        await report_thread.send(header)
-                        for i in range(0, len(report), 1900):
-                            await report_thread.send(report[i:i+1900])
+                # Post Report
+                header = f"{header_prefix}\n"
+                if len(report) + len(header) < 2000:
+                    await report_thread.send(header + report)
+                else:
+                    # One request with the full report attached instead of a message per 1900 chars
+                    report_file = discord.File(
+                        fp=io.BytesIO(report.encode('utf-8')),
+                        filename=f"report_{timestamp_str.replace(' ', '_').replace(':', '')}.md"
+                    )
+                    await report_thread.send(content=header + "📎 レポートが長いため全文をファイルで添付しました。", file=report_file)
                         
             except Exception as e:
                 print(f"[{self.guild_id}] Error in reporting: {e}")
@@ -315,7 +483,8 @@ class GuildSession:
                         await self.target_text_channel.send(f"⚠️ エラー: {e}")
             
             finally:
-                cleanup_files(files_to_cleanup)
+                # Unlinks run in a worker thread; the report path doesn't wait for them
+                self.spawn_background(acleanup_files(files_to_cleanup))
 
         except Exception as e:
              print(f"[{self.guild_id}] Error in perform_analysis: {e}")
@@ -324,13 +493,23 @@ class SessionManager:
     def __init__(self, bot):
         self.bot = bot
         self.sessions: Dict[int, GuildSession] = {}
+        # Shared by all guilds so concurrency stays bounded however many are recording.
+        # Gemini calls are network-bound and hold the GIL only briefly, so threads are enough.
+        self.analysis_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="analyze")
+        # The only ffmpeg pool: handed to audio_processor for blocking encodes
+        self.ffmpeg_executor = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="ffmpeg")
 
     def get_session(self, guild_id: int) -> GuildSession:
         if guild_id not in self.sessions:
-            self.sessions[guild_id] = GuildSession(guild_id, self.bot)
+            self.sessions[guild_id] = GuildSession(guild_id, self.bot, self)
         return self.sessions[guild_id]
 
     async def cleanup_session(self, guild_id: int, skip_final=False):
         if guild_id in self.sessions:
             await self.sessions[guild_id].stop_recording(skip_final=skip_final)
             del self.sessions[guild_id]
+
+    def shutdown(self):
+        """Stops the shared executors; call once the bot's event loop has finished."""
+        self.analysis_executor.shutdown(wait=True, cancel_futures=True)
+        self.ffmpeg_executor.shutdown(wait=True, cancel_futures=True)
@@ -1,73 +1,171 @@
 import os
 import sys
-from google import genai
-from google.genai import types
-from dotenv import load_dotenv
+import json
+import functools
+import asyncio
+import random
+import time
+from collections import deque
+from google.genai import errors, types
+from insight_bot.env import get_api_key
+from insight_bot.config import CACHE_DIR
+from insight_bot.clients import get_client
+from insight_bot.model_cache import load_cached_models, save_cached_models
+from insight_bot.script_log import setup_script_logging
 
-load_dotenv()
+log = setup_script_logging()
 
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    print("Error: GEMINI_API_KEY not found in environment.")
+try:
+    api_key = get_api_key()
+except RuntimeError as e:
+    log.error(f"Error: {e}")
     sys.exit(1)
 
-print(f"--- Environment Info ---")
-print(f"Python: {sys.version}")
-try:
+SDK_INFO_CACHE = os.path.join(CACHE_DIR, "sdk_info.json")
+
+@functools.lru_cache(maxsize=1)
+def sdk_info():
+    """
+    (location, version) of google-genai. importlib.metadata.version scans every
+    sys.path entry, so the result is kept on disk per interpreter prefix and
+    reused while the package directory is unchanged (an upgrade touches it).
+    """
     import google.genai
-    print(f"google-genai location: {os.path.dirname(google.genai.__file__)}")
-    # Try to find version if available
+    location = os.path.dirname(google.genai.__file__)
+    mtime = os.stat(location).st_mtime
+    try:
+        with open(SDK_INFO_CACHE) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    entry = cache.get(sys.prefix)
+    if entry and entry["location"] == location and entry["mtime"] == mtime:
+        return location, entry["version"]
+
     from importlib.metadata import version
-    print(f"google-genai version: {version('google-genai')}")
+    sdk_version = version('google-genai')
+    cache[sys.prefix] = {"location": location, "mtime": mtime, "version": sdk_version}
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(SDK_INFO_CACHE, "w") as f:
+            json.dump(cache, f)
+    except OSError:
+        pass
+    return location, sdk_version
+
+log.info(f"--- Environment Info ---")
+log.info(f"Python: {sys.version}")
+try:
+    location, sdk_version = sdk_info()
+    log.info(f"google-genai location: {location}")
+    log.info(f"google-genai version: {sdk_version}")
 except Exception as e:
-    print(f"Could not determine SDK version: {e}")
+    log.info(f"Could not determine SDK version: {e}")
 
-print(f"\n--- Initializing Client ---")
+log.info(f"\n--- Initializing Client ---")
 try:
-    client = genai.Client(api_key=api_key)
-    print("Client initialized successfully.")
+    # Shared client with native httpx transports, so the client.aio probes
+    # below run concurrently over one pooled AsyncClient
+    client = get_client(api_key)
+    log.info("Client initialized successfully.")
 except Exception as e:
-    print(f"Client initialization failed: {e}")
+    log.error(f"Client initialization failed: {e}")
     sys.exit(1)
 
-print(f"\n--- Available Models ---")
+# The endpoint's maximum page size: the whole list comes back in one request
+MODEL_PAGE_SIZE = 1000
+
+log.info(f"\n--- Available Models ---")
 try:
-    # v1.0 SDK style listing
-    # Note: list() returns an iterator/generator of Model objects
-    models = list(client.models.list())
-    print(f"Found {len(models)} models.")
+    # The list changes rarely; reuse the on-disk copy for a day
+    models = load_cached_models(api_key)
+    if models is None:
+        # v1.0 SDK style listing
+        # Note: list() returns an iterator/generator of Model objects
+        models = save_cached_models(api_key, client.models.list(config=types.ListModelsConfig(page_size=MODEL_PAGE_SIZE)))
+    else:
+        log.info("(cached)")
+    lines = [f"Found {len(models)} models."]
     
     for m in models:
-        # Check if it supports generateContent
-        supported_methods = m.supported_actions if hasattr(m, 'supported_actions') else []
-        if 'generateContent' in str(supported_methods) or not supported_methods:
-             print(f"- {m.name} ({m.display_name})")
+        # Check if it supports generateContent (models that don't report actions are assumed to)
+        actions = m.get("supported_actions")
+        if not actions or 'generateContent' in actions:
+             lines.append(f"- {m['name']} ({m['display_name']})")
         else:
-             print(f"- {m.name} [No generateContent support]")
+             lines.append(f"- {m['name']} [No generateContent support]")
+    # One record instead of a line per model
+    log.info("\n".join(lines))
 
 except Exception as e:
-    print(f"Failed to list models: {e}")
+    log.error(f"Failed to list models: {e}")
 
-print("\n--- Testing Specific Model Names ---")
+log.info("\n--- Testing Specific Model Names ---")
 test_models = ["gemini-2.0-flash", "gemini-1.5-flash", "gemini-flash-latest", "gemini-pro-latest"]
 
-for model_name in test_models:
-    print(f"Testing {model_name}...", end=" ")
-    try:
-        # Replicate analyzer.py config
-        tool_config = types.Tool(
-            google_search=types.GoogleSearch()
-        )
-        generate_config = types.GenerateContentConfig(
-            tools=[tool_config],
-            response_modalities=["TEXT"]
-        )
-        
-        response = client.models.generate_content(
-            model=model_name,
-            contents="Hello, ignore this.",
-            config=generate_config
-        )
-        print("OK ✅")
-    except Exception as e:
-        print(f"FAILED ❌ ({e})")
+# Replicate analyzer.py config
+tool_config = types.Tool(
+    google_search=types.GoogleSearch()
+)
+generate_config = types.GenerateContentConfig(
+    tools=[tool_config],
+    response_modalities=["TEXT"]
+)
+
+# Stay under the API's per-minute quota however long test_models gets
+PROBE_CONCURRENCY = 20
+PROBE_RATE = 60  # requests per PROBE_PERIOD
+PROBE_PERIOD = 60  # seconds
+PROBE_MAX_ATTEMPTS = 5
+PROBE_MAX_BACKOFF = 30  # seconds
+
+class RateLimiter:
+    """Sliding-window limiter: at most `rate` entries per `period` seconds."""
+    def __init__(self, rate, period):
+        self.rate = rate
+        self.period = period
+        self._starts = deque()
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        async with self._lock:
+            now = time.monotonic()
+            while self._starts and now - self._starts[0] >= self.period:
+                self._starts.popleft()
+            if len(self._starts) >= self.rate:
+                await asyncio.sleep(self._starts.popleft() + self.period - now)
+            self._starts.append(time.monotonic())
+
+    async def __aexit__(self, *exc):
+        return False
+
+async def probe(model_name, sem, limiter):
+    for attempt in range(PROBE_MAX_ATTEMPTS):
+        try:
+            async with sem, limiter:
+                await client.aio.models.generate_content(
+                    model=model_name,
+                    contents="Hello, ignore this.",
+                    config=generate_config
+                )
+            return model_name, None
+        except errors.ClientError as e:
+            if e.code != 429 or attempt == PROBE_MAX_ATTEMPTS - 1:
+                return model_name, e
+            # Quota hit: back off exponentially with jitter, outside the semaphore
+            await asyncio.sleep(min(PROBE_MAX_BACKOFF, 2 ** attempt) + random.random())
+        except Exception as e:
+            return model_name, e
+
+async def probe_all():
+    # Probes run concurrently up to the pool and rate limits: wall time ~ the
+    # slowest model for short lists, ~len/PROBE_RATE periods for long ones
+    sem = asyncio.Semaphore(PROBE_CONCURRENCY)
+    limiter = RateLimiter(PROBE_RATE, PROBE_PERIOD)
+    return await asyncio.gather(*(probe(m, sem, limiter) for m in test_models))
+
+for model_name, error in asyncio.run(probe_all()):
+    if error is None:
+        log.info(f"Testing {model_name}... OK ✅")
+    else:
+        log.info(f"Testing {model_name}... FAILED ❌ ({error})")
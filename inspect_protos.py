@@ -1,9 +1,21 @@
-import google.generativeai as genai
+import re
 import textwrap
+from insight_bot.script_log import setup_script_logging
 
-print("Available attributes in genai.protos:")
-attrs = [a for a in dir(genai.protos) if "Search" in a or "Tool" in a]
-print(attrs)
+log = setup_script_logging()
 
-# Check Tool class definition if possible (or just attributes)
-# We want to see if it takes google_search or google_search_retrieval
+# One regex pass per attribute name instead of two substring scans
+_SEARCH_OR_TOOL = re.compile(r"Search|Tool")
+
+def main():
+    import google.generativeai as genai
+
+    log.info("Available attributes in genai.protos:")
+    attrs = list(filter(_SEARCH_OR_TOOL.search, dir(genai.protos)))
+    log.info("%s", attrs)
+
+    # Check Tool class definition if possible (or just attributes)
+    # We want to see if it takes google_search or google_search_retrieval
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,13 @@
-from google import genai
 import inspect
+from insight_bot.script_log import setup_script_logging
 
-client = genai.Client(api_key="TEST")
-print(inspect.signature(client.files.upload))
+log = setup_script_logging()
+
+def main():
+    from google import genai
+
+    client = genai.Client(api_key="TEST")
+    log.info("%s", inspect.signature(client.files.upload))
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,12 @@
 import google.generativeai as genai
-import os
-from dotenv import load_dotenv
+from insight_bot.env import get_api_key
+from insight_bot.script_log import setup_script_logging
 
-load_dotenv("insight_bot/.env")
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+log = setup_script_logging()
 
-print("Listing available models...")
+genai.configure(api_key=get_api_key())
+
+log.info("Listing available models...")
 for m in genai.list_models():
     if 'generateContent' in m.supported_generation_methods:
-        print(m.name)
+        log.info(m.name)
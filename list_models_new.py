@@ -1,14 +1,39 @@
-from google import genai
-import os
-from dotenv import load_dotenv
+# get_client() uses httpx's native AsyncHTTPTransport instead of the SDK's
+# thread-pool fallback; the client keeps one httpx.AsyncClient (and its TLS
+# connection) for the whole listing.
+import sys
+import asyncio
+from google.genai import types
+from insight_bot.env import get_api_key
+from insight_bot.clients import get_client
+from insight_bot.model_cache import load_cached_models, save_cached_models
+from insight_bot.script_log import setup_script_logging, flush_script_log
 
-load_dotenv("insight_bot/.env")
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+log = setup_script_logging()
 
-print("Listing models via google-genai SDK...")
+api_key = get_api_key()
+client = get_client(api_key)
+
+async def list_models():
+    # Pager object, iterate to get models; at the maximum page size the
+    # whole list normally arrives in a single request
+    pager = await client.aio.models.list(config=types.ListModelsConfig(page_size=1000))
+    return [model async for model in pager]
+
+log.info("Listing models via google-genai SDK...")
 try:
-    # Pager object, iterate to get models
-    for model in client.models.list():
-        print(model.name)
+    models = load_cached_models(api_key)
+    if models is None:
+        models = save_cached_models(api_key, asyncio.run(list_models()))
+    else:
+        log.info("(cached)")
+    names = [model["name"] for model in models]
+    if "--stream" in sys.argv:
+        flush_script_log()
+        for name in names:
+            print(name, flush=True)
+    else:
+        # One record (and one write) instead of a line per model
+        log.info("\n".join(names))
 except Exception as e:
-    print(f"Error listing models: {e}")
+    log.error(f"Error listing models: {e}")
@@ -3,14 +3,18 @@ import sys
 import os
 
 # Fix SSL certificate issue for PyInstaller builds - MUST be before any SSL imports
-if getattr(sys, 'frozen', False):
+# Skipped when already configured (e.g. inherited from a supervisor that re-launches us)
+if getattr(sys, 'frozen', False) and 'SSL_CERT_FILE' not in os.environ:
     import certifi
     cert_path = certifi.where()
-    os.environ['SSL_CERT_FILE'] = cert_path
-    os.environ['SSL_CERT_DIR'] = os.path.dirname(cert_path)
-    os.environ['REQUESTS_CA_BUNDLE'] = cert_path
-
-from insight_bot.bot import run_bot
+    os.environ.update({
+        'SSL_CERT_FILE': cert_path,
+        'SSL_CERT_DIR': os.path.dirname(cert_path),
+        'REQUESTS_CA_BUNDLE': cert_path,
+    })
 
 if __name__ == "__main__":
+    # Imported here so importing main.py (e.g. by PyInstaller hooks or tools) doesn't load py-cord/genai
+    from insight_bot.bot import run_bot
+
     run_bot()
@@ -1,46 +1,57 @@
-import google.generativeai as genai
-import os
-from dotenv import load_dotenv
+from functools import lru_cache
+from google.genai import errors, types
+from insight_bot.clients import get_client
+from insight_bot.script_log import setup_script_logging
 
-load_dotenv("insight_bot/.env")
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+log = setup_script_logging()
+
+client = get_client()
 
 model_name = "gemini-1.5-flash-latest" # or gemini-flash-latest
+prompt = "What is the latest news about Python?"
 
-print(f"Testing model: {model_name}")
+log.info(f"Testing model: {model_name}")
 
 # Attempt 1: String (Failed)
 # tools = "google_search" 
 
-# Attempt 2: Tool Object
-try:
-    print("Attempting with Tool object...")
-    # This structure depends on the exact SDK version, probing common paths
-    tool = genai.protos.Tool(
-        google_search = genai.protos.GoogleSearch()
-    )
-    model = genai.GenerativeModel(model_name, tools=[tool])
-    print("Model initialized with Tool object.")
-    
-    # Try a simple generation to see if it accepts it
-    # We won't actually run it to save quota/time, just initialization, 
-    # but the error might happen at generate_content time.
-    # So let's try a dry run.
-    print("Generating content...")
-    response = model.generate_content("What is the latest news about Python?")
-    print("Success!")
-    print(response.text[:100])
-except Exception as e:
-    print(f"Attempt 2 Failed: {e}")
-
-# Attempt 3: Config Dict
-try:
-    print("\nAttempting with Config Dict...")
-    tools = [{'google_search': {}}]
-    model = genai.GenerativeModel(model_name, tools=tools)
-    print("Model initialized with Config Dict.")
-    response = model.generate_content("What is the latest news about Python?")
-    print("Success!")
-    print(response.text[:100])
-except Exception as e:
-    print(f"Attempt 3 Failed: {e}")
+# Tool config shapes, most likely first. The next one is only tried if the
+# previous shape is rejected, so the common case costs a single API call.
+_TOOL_SPECS = {
+    # Attempt 2: Tool Object
+    "Tool object": lambda: [types.Tool(google_search=types.GoogleSearch())],
+    # Attempt 3: Config Dict
+    "Config dict": lambda: [{'google_search': {}}],
+}
+
+@lru_cache(maxsize=32)
+def get_config(tool_key):
+    """Builds (and validates) each GenerateContentConfig once per tool shape."""
+    return types.GenerateContentConfig(tools=_TOOL_SPECS[tool_key]())
+
+last_error = None
+for label in _TOOL_SPECS:
+    log.info(f"Attempting with {label}...")
+    # Tool config is only validated at generate_content time, so run a real generation
+    try:
+        response = client.models.generate_content(
+            model=model_name,
+            contents=prompt,
+            config=get_config(label)
+        )
+    except (TypeError, ValueError, AttributeError) as e:
+        # Rejected client-side (SDK/pydantic validation)
+        last_error = e
+    except errors.ClientError as e:
+        # Only a 400 means the shape was rejected; auth/quota errors are real failures
+        if e.code != 400:
+            raise
+        last_error = e
+    else:
+        log.info(f"{label}: Success!")
+        log.info(response.text[:100])
+        break
+    log.info(f"{label} Failed: {last_error}")
+else:
+    log.error("No tool config shape was accepted.")
+    raise last_error